@@ -7,35 +7,116 @@ as a baseline for reproducibility and CI verification.
 
 from __future__ import annotations
 
+import argparse
+import functools
+import multiprocessing
 import os
+import tempfile
 from pathlib import Path
-from typing import Tuple
+from typing import Callable, Sequence, Tuple
 
 import numpy as np
-import matplotlib.pyplot as plt
+import matplotlib
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from utils import pdf_to_png, pdf_to_svg, tool_exists
 
 
 ROOT = Path(__file__).resolve().parents[1]
 OUT_PNG = ROOT / "diagrams" / "png"
 OUT_SVG = ROOT / "diagrams" / "svg"
 OUT_PDF = ROOT / "diagrams" / "pdf"
-
-
-def _ensure_dirs() -> None:
-    for d in (OUT_PNG, OUT_SVG, OUT_PDF):
-        d.mkdir(parents=True, exist_ok=True)
-
-
-def _save_all_formats(fig: plt.Figure, stem: str) -> None:
+OUT_DIRS = {"png": OUT_PNG, "svg": OUT_SVG, "pdf": OUT_PDF}
+FORMATS: Tuple[str, ...] = ("png", "svg", "pdf")
+
+# Shared style for all Python-generated figures, applied once at import.
+STYLE = {
+    "figure.figsize": (6.5, 4.0),
+    # Draw at screen resolution; savefig.dpi sets the PNG output resolution.
+    "figure.dpi": 100,
+    "savefig.dpi": 300,
+    "font.size": 10,
+    "axes.grid": True,
+    "grid.alpha": 0.25,
+    # Embed TrueType (Type 42) subsets instead of Matplotlib's Type 3 glyph procedures.
+    "pdf.fonttype": 42,
+}
+matplotlib.rcParams.update(STYLE)
+
+# Fixed sample grids, built once and reused by every render.
+FREQ_ZEEMAN_GHZ = np.linspace(2.80, 2.94, 1200)  # around D = 2.87 GHz
+TEMP_K = np.linspace(270, 330, 200)
+
+
+def _ensure_dirs(formats: Sequence[str] = FORMATS) -> None:
+    for fmt in formats:
+        OUT_DIRS[fmt].mkdir(parents=True, exist_ok=True)
+
+
+def _new_figure() -> Tuple[Figure, Axes]:
+    # Headless figure on an explicit Agg canvas: no pyplot figure manager,
+    # backend lookup, or close() bookkeeping per figure.
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots()
+
+
+def _save_formats(fig: Figure, stem: str, formats: Sequence[str] = FORMATS) -> None:
     # Deterministic-ish save settings (fonts and OS rendering can still vary).
-    fig.savefig(OUT_PNG / f"{stem}.png", dpi=300, bbox_inches="tight")
-    fig.savefig(OUT_SVG / f"{stem}.svg", bbox_inches="tight")
-    fig.savefig(OUT_PDF / f"{stem}.pdf", bbox_inches="tight")
+    png_path = OUT_PNG / f"{stem}.png"
+    svg_path = OUT_SVG / f"{stem}.svg"
+    want_png = "png" in formats
+    want_svg = "svg" in formats
+
+    # Render the PDF once and convert it with Poppler rather than re-drawing
+    # the figure through Matplotlib's Agg and SVG backends. When the PDF
+    # itself was not requested it only lives in a scratch directory.
+    png_ok = svg_ok = False
+    with tempfile.TemporaryDirectory() as td:
+        pdf_path = (OUT_PDF if "pdf" in formats else Path(td)) / f"{stem}.pdf"
+        use_poppler = (want_png or want_svg) and tool_exists("pdftocairo")
+        if "pdf" in formats or use_poppler:
+            fig.savefig(pdf_path, bbox_inches="tight")
+        if use_poppler:
+            if want_png:
+                dpi = int(matplotlib.rcParams["savefig.dpi"])
+                png_ok = pdf_to_png(pdf_path, png_path, dpi=dpi)
+            if want_svg:
+                svg_ok = pdf_to_svg(pdf_path, svg_path)
+
+    if want_png and not png_ok:
+        # zlib level 1: PNG encoding dominates save time at 300 DPI; files are somewhat larger.
+        fig.savefig(png_path, bbox_inches="tight", pil_kwargs={"compress_level": 1})
+    if want_svg and not svg_ok:
+        fig.savefig(svg_path, bbox_inches="tight")
+
+
+def lorentzian(
+    freq_ghz: np.ndarray,
+    center_ghz: np.ndarray | float,
+    gamma_ghz: float,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Unit-height Lorentzian gamma^2 / ((f - c)^2 + gamma^2), computed in place.
+
+    All arithmetic is done inside a single result buffer, so no intermediate
+    arrays are allocated; when ``out`` is omitted, that result buffer itself
+    is allocated. ``center_ghz`` may be an array shaped to broadcast against
+    ``freq_ghz`` (e.g. ``(n_centers, 1)``).
+    """
+    g2 = gamma_ghz**2
+    out = np.subtract(freq_ghz, center_ghz, out=out)
+    np.square(out, out=out)
+    out += g2
+    return np.divide(g2, out, out=out)
 
 
 def odmr_spectrum(
     freq_ghz: np.ndarray,
-    centers_ghz: Tuple[float, float],
+    centers_ghz: Tuple[float, float] | np.ndarray,
     contrast: float = 0.03,
     linewidth_mhz: float = 8.0,
     baseline: float = 1.0,
@@ -43,42 +124,41 @@ def odmr_spectrum(
     """
     Simple illustrative ODMR dip model: sum of two Lorentzian dips.
     This is NOT a full physical ODMR model; it is a deterministic schematic-like plot.
+
+    ``centers_ghz`` may also be an array of shape ``(n_spectra, n_dips)``, in
+    which case all spectra are evaluated in one pass and returned with shape
+    ``(n_spectra, len(freq_ghz))``.
     """
     gamma = (linewidth_mhz * 1e-3) / 2.0  # convert MHz to GHz, HWHM
-    y = np.full_like(freq_ghz, baseline, dtype=float)
-    for c in centers_ghz:
-        lor = gamma**2 / ((freq_ghz - c) ** 2 + gamma**2)
-        y -= contrast * lor
+    # Evaluate all dips in one broadcast pass: (..., n_dips, 1) against (n_freq,).
+    centers = np.asarray(centers_ghz, dtype=float)[..., np.newaxis]
+    dips = np.empty(np.broadcast_shapes(centers.shape, np.shape(freq_ghz)))
+    y = lorentzian(freq_ghz, centers, gamma, out=dips).sum(axis=-2)
+    y *= -contrast
+    y += baseline
     return y
 
 
-def fig3_zeeman_splitting() -> None:
+def fig3_zeeman_splitting(
+    f: np.ndarray = FREQ_ZEEMAN_GHZ, formats: Sequence[str] = FORMATS
+) -> None:
     """
     Figure 3: illustrative Zeeman splitting of ODMR dips under B fields.
     Uses fixed parameters for deterministic output.
     """
-    # Fixed frequency axis around 2.87 GHz
-    f = np.linspace(2.80, 2.94, 1200)
     D = 2.870  # GHz (ZFS)
     gamma_e = 28.025  # GHz/T (electron gyromagnetic ratio)
 
     # Fields in mT (illustrative)
-    fields_mT = [0.0, 3.0, 5.0]
-
-    plt.rcParams.update(
-        {
-            "figure.figsize": (6.5, 4.0),
-            "font.size": 10,
-            "axes.grid": True,
-            "grid.alpha": 0.25,
-        }
-    )
+    fields_mT = np.array([0.0, 3.0, 5.0])
 
-    fig, ax = plt.subplots()
-    for BmT in fields_mT:
-        B = BmT * 1e-3  # T
-        split = gamma_e * B  # GHz (approx, illustrative)
-        y = odmr_spectrum(f, centers_ghz=(D - split, D + split), contrast=0.035, linewidth_mhz=10.0)
+    B = fields_mT * 1e-3  # T
+    split = gamma_e * B  # GHz (approx, illustrative)
+    centers = np.stack((D - split, D + split), axis=-1)  # (n_fields, 2)
+    spectra = odmr_spectrum(f, centers_ghz=centers, contrast=0.035, linewidth_mhz=10.0)
+
+    fig, ax = _new_figure()
+    for BmT, y in zip(fields_mT, spectra):
         ax.plot(f, y, label=f"B = {BmT:.0f} mT")
 
     ax.set_title("Illustrative ODMR Zeeman Splitting (NV Center)")
@@ -87,11 +167,12 @@ def fig3_zeeman_splitting() -> None:
     ax.set_xlim(f.min(), f.max())
     ax.legend(frameon=False)
 
-    _save_all_formats(fig, "fig3_zeeman_splitting")
-    plt.close(fig)
+    _save_formats(fig, "fig3_zeeman_splitting", formats)
 
 
-def fig6_temperature_shift() -> None:
+def fig6_temperature_shift(
+    T: np.ndarray = TEMP_K, formats: Sequence[str] = FORMATS
+) -> None:
     """
     Figure 6: temperature dependence of the ZFS parameter D.
     Uses linear coefficient dD/dT ≈ -74.2 kHz/K as an illustrative model.
@@ -100,21 +181,11 @@ def fig6_temperature_shift() -> None:
     T0 = 300.0  # K
     dD_dT_khz_per_K = -74.2  # kHz/K
 
-    T = np.linspace(270, 330, 200)
     dT = T - T0
     # Convert kHz -> GHz: 1 kHz = 1e-6 GHz
     D = D0 + (dD_dT_khz_per_K * 1e-6) * dT
 
-    plt.rcParams.update(
-        {
-            "figure.figsize": (6.5, 4.0),
-            "font.size": 10,
-            "axes.grid": True,
-            "grid.alpha": 0.25,
-        }
-    )
-
-    fig, ax = plt.subplots()
+    fig, ax = _new_figure()
     ax.plot(T, D)
     ax.set_title("Temperature Dependence of NV ZFS Parameter D (Illustrative)")
     ax.set_xlabel("Temperature (K)")
@@ -126,18 +197,47 @@ def fig6_temperature_shift() -> None:
         arrowprops={"arrowstyle": "->"},
     )
 
-    _save_all_formats(fig, "fig6_temperature_shift")
-    plt.close(fig)
+    _save_formats(fig, "fig6_temperature_shift", formats)
+
+
+FIGURES: Tuple[Callable[..., None], ...] = (
+    fig3_zeeman_splitting,
+    fig6_temperature_shift,
+)
+
+
+def _render(fig_func: Callable[..., None], formats: Sequence[str] = FORMATS) -> None:
+    fig_func(formats=formats)
+
+
+def _parse_formats(value: str) -> Tuple[str, ...]:
+    formats = tuple(dict.fromkeys(v.strip().lower() for v in value.split(",") if v.strip()))
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if not formats or unknown:
+        raise argparse.ArgumentTypeError(
+            f"expected a comma-separated subset of {','.join(FORMATS)}, got {value!r}"
+        )
+    return formats
 
 
 def main() -> None:
-    _ensure_dirs()
-    fig3_zeeman_splitting()
-    fig6_temperature_shift()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--formats",
+        type=_parse_formats,
+        default=FORMATS,
+        help="comma-separated output formats to write (default: png,svg,pdf)",
+    )
+    args = parser.parse_args()
+
+    _ensure_dirs(args.formats)
+    # Figures are independent, so render and encode them in parallel.
+    workers = min(len(FIGURES), os.cpu_count() or 1)
+    with multiprocessing.Pool(workers) as pool:
+        pool.map(functools.partial(_render, formats=args.formats), FIGURES)
     print("Generated figures:")
-    print(f"  PNG: {OUT_PNG}")
-    print(f"  SVG: {OUT_SVG}")
-    print(f"  PDF: {OUT_PDF}")
+    for fmt in args.formats:
+        print(f"  {fmt.upper()}: {OUT_DIRS[fmt]}")
 
 
 if __name__ == "__main__":
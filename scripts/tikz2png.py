@@ -7,7 +7,7 @@ Input directory:
 
 Outputs:
   diagrams/pdf/<stem>.pdf
-  diagrams/png/<stem>.png   (300 DPI)
+  diagrams/png/<stem>.png   (300 DPI, capped at 4096 px on the longest side)
   diagrams/svg/<stem>.svg
 
 Required:
@@ -15,113 +15,187 @@ Required:
 
 Preferred converters (in priority order):
   - pdftocairo (Poppler)  [recommended on macOS via: brew install poppler]
+  - pdftoppm (Poppler, PNG only)
   - ImageMagick (magick/convert)
   - pdf2svg (SVG only)
 """
 
 from __future__ import annotations
 
-import shutil
+import hashlib
+import os
 import subprocess
 import sys
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
+from utils import (
+    PNG_CONVERTERS,
+    SVG_CONVERTERS,
+    pdf_to_png,
+    pdf_to_svg,
+    png_dpi,
+    run,
+    tool_exists,
+)
+
 
 ROOT = Path(__file__).resolve().parents[1]
 TIKZ_DIR = ROOT / "diagrams" / "source" / "tikz"
 PNG_DIR = ROOT / "diagrams" / "png"
 SVG_DIR = ROOT / "diagrams" / "svg"
 PDF_DIR = ROOT / "diagrams" / "pdf"
+CACHE_DIR = ROOT / "diagrams" / ".cache"
 
-
-def tool_exists(name: str) -> bool:
-    return shutil.which(name) is not None
-
-
-def run(cmd: list[str], cwd: Path | None = None) -> subprocess.CompletedProcess:
-    return subprocess.run(
-        cmd, cwd=str(cwd) if cwd else None, capture_output=True, text=True
-    )
+# Anything smaller is a truncated PDF from a crashed pdflatex run.
+MIN_PDF_BYTES = 1024
 
 
 def ensure_dirs() -> None:
-    for d in (PNG_DIR, SVG_DIR, PDF_DIR):
+    for d in (PNG_DIR, SVG_DIR, PDF_DIR, CACHE_DIR):
         d.mkdir(parents=True, exist_ok=True)
 
 
-def compile_pdf(tex_file: Path, tmpdir: Path) -> Path | None:
-    shutil.copy(tex_file, tmpdir / tex_file.name)
-    res = run(["pdflatex", "-interaction=nonstopmode", tex_file.name], cwd=tmpdir)
-
-    pdf_path = tmpdir / f"{tex_file.stem}.pdf"
-    if not pdf_path.exists():
-        print(f"ERROR: pdflatex failed for {tex_file.name}")
-        if res.stdout:
-            print(res.stdout[-800:])
-        if res.stderr:
-            print(res.stderr[-800:])
-        return None
-    return pdf_path
-
-
-def pdf_to_png(pdf_path: Path, png_out: Path, dpi: int = 300) -> bool:
-    if tool_exists("pdftocairo"):
-        prefix = png_out.with_suffix("")
-        run(["pdftocairo", "-png", "-r", str(dpi), str(pdf_path), str(prefix)])
-        # pdftocairo appends -1 for single-page PDFs
-        candidate = prefix.parent / f"{prefix.name}-1.png"
-        if candidate.exists():
-            candidate.replace(png_out)
-            return True
-        if png_out.exists():
-            return True
+@dataclass
+class CompileResult:
+    """Outcome of building one TikZ source, reported by main() in one summary."""
+
+    name: str
+    ok: bool
+    pdf: bool = False
+    png: bool = False
+    svg: bool = False
+    cached: bool = False
+    errmsg: str | None = None
+
+    @property
+    def status(self) -> str:
+        if not self.ok:
+            return "FAILED"
+        if self.cached:
+            return "cached"
+        made = [fmt for fmt, done in (("PDF", self.pdf), ("PNG", self.png), ("SVG", self.svg)) if done]
+        return " ".join(made)
+
+
+def _pdf_written(path: Path) -> bool:
+    try:
+        return path.stat().st_size >= MIN_PDF_BYTES
+    except FileNotFoundError:
         return False
 
-    if tool_exists("magick"):
-        res = run(["magick", "-density", str(dpi), str(pdf_path), "-quality", "100", str(png_out)])
-        return png_out.exists() and res.returncode == 0
-
-    if tool_exists("convert"):
-        res = run(["convert", "-density", str(dpi), str(pdf_path), "-quality", "100", str(png_out)])
-        return png_out.exists() and res.returncode == 0
-
-    print("  (skipping PNG - no converter found: install poppler or ImageMagick)")
-    return False
-
-
-def pdf_to_svg(pdf_path: Path, svg_out: Path) -> bool:
-    if tool_exists("pdftocairo"):
-        res = run(["pdftocairo", "-svg", str(pdf_path), str(svg_out)])
-        return svg_out.exists() and res.returncode == 0
 
-    if tool_exists("pdf2svg"):
-        res = run(["pdf2svg", str(pdf_path), str(svg_out)])
-        return svg_out.exists() and res.returncode == 0
-
-    print("  (skipping SVG - no converter found: install poppler or pdf2svg)")
-    return False
-
-
-def compile_one(tex_file: Path) -> bool:
+def _read_log(path: Path) -> str:
+    return path.read_text(errors="replace") if path.exists() else ""
+
+
+def compile_pdf(tex_file: Path, workdir: Path) -> tuple[Path | None, str | None]:
+    """Run pdflatex into ``workdir``. Returns the PDF path, or None and an error excerpt."""
+    # The work dir persists, so clear the previous PDF: a failed run must
+    # not leave a stale one behind that looks like success.
+    pdf_path = workdir / f"{tex_file.stem}.pdf"
+    pdf_path.unlink(missing_ok=True)
+
+    # batchmode keeps the terminal silent (diagnostics still go to the .log)
+    # and -halt-on-error stops at the first error instead of recovering.
+    # The source is read in place (relative \input paths resolve as usual)
+    # and everything pdflatex writes goes to the work dir, so nothing is
+    # copied in beforehand.
+    cmd = [
+        "pdflatex",
+        "-interaction=batchmode",
+        "-halt-on-error",
+        f"-output-directory={workdir}",
+        tex_file.name,
+    ]
+    tex_log = workdir / f"{tex_file.stem}.log"
+    res = run(cmd, cwd=tex_file.parent, stdout=subprocess.DEVNULL)
+
+    # A standalone TikZ picture has no cross-references, so one pass is
+    # enough. Only rerun when LaTeX itself asks for it.
+    if _pdf_written(pdf_path) and "Rerun to get" in _read_log(tex_log):
+        res = run(cmd, cwd=tex_file.parent, stdout=subprocess.DEVNULL)
+
+    if not _pdf_written(pdf_path):
+        details = [_read_log(tex_log)[-800:], (res.stderr or "")[-800:]]
+        return None, "\n".join(d.rstrip() for d in details if d.strip())
+    return pdf_path, None
+
+
+def compile_one(tex_file: Path) -> CompileResult:
+    """
+    Compile one TikZ file and convert it. Runs in a worker thread, so it
+    prints nothing; main() reports all results together.
+    """
     stem = tex_file.stem
-    print(f"Compiling {tex_file.name} ...")
-    with tempfile.TemporaryDirectory() as td:
-        tmpdir = Path(td)
-        pdf_path = compile_pdf(tex_file, tmpdir)
-        if pdf_path is None:
-            return False
-
-        shutil.copy(pdf_path, PDF_DIR / f"{stem}.pdf")
-        print("  -> PDF")
 
-        if pdf_to_png(pdf_path, PNG_DIR / f"{stem}.png", dpi=300):
-            print("  -> PNG")
-
-        if pdf_to_svg(pdf_path, SVG_DIR / f"{stem}.svg"):
-            print("  -> SVG")
-
-    return True
+    # Skip the whole toolchain when the source is byte-identical to the
+    # last successful build and every output is still in place.
+    digest = hashlib.blake2b(tex_file.read_bytes()).hexdigest()
+    hash_file = CACHE_DIR / f"{stem}.hash"
+    png_out = PNG_DIR / f"{stem}.png"
+    svg_out = SVG_DIR / f"{stem}.svg"
+    outputs = (PDF_DIR / f"{stem}.pdf", png_out, svg_out)
+    if (
+        hash_file.exists()
+        and hash_file.read_text().strip() == digest
+        and all(p.exists() for p in outputs)
+    ):
+        return CompileResult(tex_file.name, ok=True, pdf=True, png=True, svg=True, cached=True)
+
+    # Rebuilding: drop the old digest so an incomplete build below can never
+    # be mistaken for a cached one. Existing outputs are kept until the
+    # converters replace them.
+    hash_file.unlink(missing_ok=True)
+
+    # Per-file work dir kept across runs; it holds the .aux/.log files that
+    # the "Rerun to get" check in compile_pdf reads.
+    workdir = CACHE_DIR / stem
+    workdir.mkdir(parents=True, exist_ok=True)
+    pdf_path, errmsg = compile_pdf(tex_file, workdir)
+    if pdf_path is None:
+        return CompileResult(tex_file.name, ok=False, errmsg=errmsg)
+
+    # The work dir sits on the same filesystem as PDF_DIR, so this is an
+    # atomic rename rather than a copy.
+    final_pdf = PDF_DIR / f"{stem}.pdf"
+    os.replace(pdf_path, final_pdf)
+    pdf_path = final_pdf
+
+    result = CompileResult(tex_file.name, ok=True, pdf=True)
+    result.png = pdf_to_png(pdf_path, png_out, dpi=png_dpi(pdf_path, 300))
+    result.svg = pdf_to_svg(pdf_path, svg_out)
+
+    # Only a complete build may be skipped next time.
+    if result.png and result.svg:
+        hash_file.write_text(digest)
+    return result
+
+
+def format_summary(results: list[CompileResult]) -> str:
+    ordered = sorted(results, key=lambda r: r.name)
+    width = max(len(r.name) for r in ordered)
+    lines = [f"  {r.name:<{width}}  {r.status}" for r in ordered]
+    for r in ordered:
+        if not r.ok:
+            lines.append(f"ERROR: pdflatex failed for {r.name}")
+            if r.errmsg:
+                lines.append(r.errmsg)
+    return "\n".join(lines)
+
+
+def find_tex_files(directory: Path) -> list[Path]:
+    # Largest sources first (longest-processing-time scheduling): the pool
+    # starts the slow compiles early and fills in with the small ones.
+    # is_file() is answered from the directory listing (d_type) on POSIX;
+    # the size sort still costs one stat() per .tex file.
+    if not directory.is_dir():
+        return []
+    with os.scandir(directory) as it:
+        entries = [e for e in it if e.name.endswith(".tex") and e.is_file()]
+    entries.sort(key=lambda e: (-e.stat().st_size, e.name))
+    return [Path(e.path) for e in entries]
 
 
 def main() -> None:
@@ -134,18 +208,28 @@ def main() -> None:
         print("  Ubuntu: apt-get install texlive-latex-base texlive-latex-extra texlive-pictures")
         sys.exit(1)
 
-    tex_files = sorted(TIKZ_DIR.glob("*.tex"))
+    tex_files = find_tex_files(TIKZ_DIR)
     if not tex_files:
         print(f"No .tex files found in {TIKZ_DIR}")
         print("Create one under diagrams/source/tikz/ and re-run.")
         return
 
-    ok = True
     print(f"Found {len(tex_files)} TikZ source files in {TIKZ_DIR}:")
-    for f in tex_files:
-        ok = compile_one(f) and ok
-
-    if not ok:
+    if not any(tool_exists(t) for t in PNG_CONVERTERS):
+        print("  (skipping PNG - no converter found: install poppler or ImageMagick)")
+    if not any(tool_exists(t) for t in SVG_CONVERTERS):
+        print("  (skipping SVG - no converter found: install poppler or pdf2svg)")
+
+    # Each file compiles in its own work dir, so they can run side by side.
+    # The heavy lifting happens in pdflatex/pdftocairo child processes;
+    # threads only wait on them (the GIL is released), so no extra
+    # Python interpreters are needed to keep several tools in flight.
+    workers = min(os.cpu_count() or 1, len(tex_files))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        results = list(ex.map(compile_one, tex_files))
+
+    print(format_summary(results))
+    if not all(r.ok for r in results):
         sys.exit(2)
 
     print("Done.")
@@ -0,0 +1,113 @@
+"""
+Shared helpers for the figure scripts: external tool lookup and
+PDF -> PNG/SVG conversion.
+
+Both generate_figures.py and tikz2png.py render a PDF first and derive the
+raster and vector outputs from it with the same converters.
+"""
+
+from __future__ import annotations
+
+import functools
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+
+# Converters tried by pdf_to_png / pdf_to_svg, in priority order.
+PNG_CONVERTERS = ("pdftocairo", "pdftoppm", "magick", "convert")
+SVG_CONVERTERS = ("pdftocairo", "pdf2svg")
+
+# Upper bound on the longest side of a rasterized page, in pixels.
+MAX_PNG_PX = 4096
+
+
+@functools.lru_cache(maxsize=None)
+def tool_exists(name: str) -> bool:
+    # PATH does not change during a run; avoid a directory scan per file and tool.
+    return shutil.which(name) is not None
+
+
+def run(
+    cmd: list[str],
+    cwd: Path | None = None,
+    stdout: int = subprocess.PIPE,
+    stderr: int = subprocess.PIPE,
+) -> subprocess.CompletedProcess:
+    # No tool here reads stdin; DEVNULL also keeps pdflatex from waiting on a prompt.
+    # Pass subprocess.DEVNULL for streams the caller never reads.
+    return subprocess.run(
+        cmd,
+        cwd=str(cwd) if cwd else None,
+        stdin=subprocess.DEVNULL,
+        stdout=stdout,
+        stderr=stderr,
+        text=True,
+    )
+
+
+def run_quiet(cmd: list[str], cwd: Path | None = None) -> subprocess.CompletedProcess:
+    """Run a tool whose output is never inspected, only its exit status."""
+    return run(cmd, cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def png_dpi(pdf_path: Path, dpi: int = 300, max_px: int = MAX_PNG_PX) -> int:
+    """
+    Resolution for rasterizing ``pdf_path``: ``dpi``, lowered if needed so
+    the longest page side stays within ``max_px`` pixels. An oversized
+    TikZ canvas would otherwise turn into a multi-gigapixel raster.
+    Falls back to ``dpi`` when pdfinfo is unavailable.
+    """
+    if not tool_exists("pdfinfo"):
+        return dpi
+    res = run(["pdfinfo", str(pdf_path)], stderr=subprocess.DEVNULL)
+    m = re.search(r"Page size:\s+([\d.]+) x ([\d.]+) pts", res.stdout)
+    if res.returncode != 0 or m is None:
+        return dpi
+    longest_pts = max(float(m.group(1)), float(m.group(2)))
+    return max(1, min(dpi, int(72 * max_px / longest_pts)))
+
+
+def pdf_to_png(pdf_path: Path, png_out: Path, dpi: int = 300) -> bool:
+    if tool_exists("pdftocairo"):
+        prefix = png_out.with_suffix("")
+        # pdftocairo appends -1 for single-page PDFs
+        candidate = prefix.parent / f"{prefix.name}-1.png"
+        # Clear earlier output so only a file written by this run counts.
+        png_out.unlink(missing_ok=True)
+        candidate.unlink(missing_ok=True)
+        res = run_quiet(["pdftocairo", "-png", "-r", str(dpi), str(pdf_path), str(prefix)])
+        if res.returncode != 0:
+            return False
+        if candidate.exists():
+            candidate.replace(png_out)
+        return png_out.exists()
+
+    # Poppler's rasterizer, without ImageMagick's Ghostscript delegate and pixel cache.
+    if tool_exists("pdftoppm"):
+        prefix = png_out.with_suffix("")
+        res = run_quiet(["pdftoppm", "-png", "-r", str(dpi), "-singlefile", str(pdf_path), str(prefix)])
+        return png_out.exists() and res.returncode == 0
+
+    if tool_exists("magick"):
+        res = run_quiet(["magick", "-density", str(dpi), str(pdf_path), "-quality", "100", str(png_out)])
+        return png_out.exists() and res.returncode == 0
+
+    if tool_exists("convert"):
+        res = run_quiet(["convert", "-density", str(dpi), str(pdf_path), "-quality", "100", str(png_out)])
+        return png_out.exists() and res.returncode == 0
+
+    return False
+
+
+def pdf_to_svg(pdf_path: Path, svg_out: Path) -> bool:
+    if tool_exists("pdftocairo"):
+        res = run_quiet(["pdftocairo", "-svg", str(pdf_path), str(svg_out)])
+        return svg_out.exists() and res.returncode == 0
+
+    if tool_exists("pdf2svg"):
+        res = run_quiet(["pdf2svg", str(pdf_path), str(svg_out)])
+        return svg_out.exists() and res.returncode == 0
+
+    return False